@@ -1,13 +1,11 @@
 """ampl language server class to hide junk from the user."""
 
-import copy
 import os
 import pathlib
 import sys
 import traceback
 import typing as t
 
-import ampl_utils
 import utils
 
 utils.update_sys_path(
@@ -16,10 +14,16 @@ utils.update_sys_path(
 )
 
 # pylint: disable=wrong-import-position,import-error
+import ampl_utils  # may use bundled libs, import after sys.path is updated
 import lsprotocol.types as lsp
 from pygls import server, uris, workspace
 
 IndexType = dict[str, dict[str, dict[str, lsp.Range]]]
+# what one source line declares, (type_name, name, start, end), and the
+# (start, end) spans of every identifier on it
+LineParse = tuple[
+    tuple[tuple[str, str, int, int], ...], dict[str, list[tuple[int, int]]]
+]
 
 
 class AMPLServer(server.LanguageServer):
@@ -43,57 +47,188 @@ class AMPLServer(server.LanguageServer):
         self.name: str = name
         self.tool_args: list[str] = tool_args
         self.index_: IndexType = {}
+        self.lines_: dict[str, list[LineParse]] = {}  # per line parse, per uri
+        self.names_: dict[str, frozenset[str]] = {}  # every indexed name, per uri
+        # indexed name -> (line, start, end) of each of its occurrences, per uri
+        self.occurrences_: dict[str, dict[str, list[tuple[int, int, int]]]] = {}
+        self._ws_trie: dict[str | None, t.Any] = {}
+        self._workspace_settings_rev: int = 0
+        self._first_workspace_settings: dict[str, t.Any] | None = None
+        self._settings_cache: dict[str, tuple[int, dict[str, t.Any]]] = {}
+        self._globals_rev: int = 0
+        self._global_defaults: tuple[int, dict[str, t.Any]] | None = None
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.module!r}, {self.name!r})"
 
-    def log(self, message: str, msg_type: lsp.MessageType = None) -> None:
+    def log(
+        self, message: str, *args: t.Any, msg_type: lsp.MessageType = None
+    ) -> None:
         """Log message to output.
 
         args:
-            - `message (str)`: message to log
+            - `message (str)`: message to log, `%` formatted with `args` if given
+            - `args (Any)`: format arguments, only applied when the message is sent
             - `msg_type (lsp.MessageType)`: message type
         """
+        if args:
+            message = message % args
         self.show_message_log(message, msg_type or self.LOG_TYPE)
 
+    def _should_log(self, settings: dict[str, t.Any]) -> bool:
+        """whether verbose tool run and indexing details should be logged.
+
+        args:
+            - `settings (dict[str, Any])`: settings of the current run
+        """
+        return settings["showNotifications"] != "off"
+
+    @staticmethod
+    def _parse_line(line: str) -> LineParse:
+        """parses the declarations and identifiers of a single line
+
+        args:
+            - `line (str)`: source line
+        returns:
+            - `LineParse`: declarations and identifier spans of the line
+        """
+        decls = tuple(
+            (type_name, match.group(1), *match.span(1))
+            for type_name, match in ampl_utils.scan_line(line)
+        )
+        words: dict[str, list[tuple[int, int]]] = {}
+        for match in ampl_utils.WORD_RE.finditer(line):
+            # no setdefault, it would allocate a throwaway list per repeated word.
+            if (spans := words.get(match.group())) is None:
+                words[match.group()] = [match.span()]
+            else:
+                spans.append(match.span())
+        return decls, words
+
     def parse_document(self, doc: workspace.TextDocument) -> IndexType:
         """parses a document and adds it results to `self.index`;
 
+        the per line results are kept in `self.lines_` so `parse_changes` can
+        re-parse only edited lines, and references are answered from them.
+
         args:
             - `doc (workspace.TextDocument)`: document to parse
         returns:
             - `dict`: index of the document
         """
-        if doc.uri not in self.index_:
-            self.index_[doc.uri] = {}
-        for linum, line in enumerate(doc.lines):
-            for _cls in (ampl_utils.Variable, ampl_utils.Function):
-                if _cls.type_name not in self.index_:
-                    self.index_[doc.uri][_cls.type_name] = {}
-                if (match := _cls.regex.match(line)) is None:
-                    continue
-                name: str = match.group(1)
-                start_char: int = match.start() + line.find(name)
-                self.index_[doc.uri][_cls.type_name][name] = lsp.Range(
-                    start=lsp.Position(line=linum, character=start_char),
-                    end=lsp.Position(line=linum, character=start_char + len(name)),
+        self.lines_[doc.uri] = [
+            self._parse_line(line) for line in utils.iter_lines(doc)
+        ]
+        return self._build_index(doc)
+
+    def parse_changes(
+        self,
+        doc: workspace.TextDocument,
+        changes: t.Sequence[lsp.TextDocumentContentChangeEvent],
+    ) -> IndexType:
+        """re-parses only the lines touched by `changes`, already applied to `doc`.
+
+        falls back to `parse_document` for full text or multiple changes.
+
+        args:
+            - `doc (workspace.TextDocument)`: document that changed
+            - `changes (Sequence[lsp.TextDocumentContentChangeEvent])`: the edits
+        returns:
+            - `dict`: index of the document
+        """
+        cached = self.lines_.get(doc.uri)
+        if cached is None or len(changes) != 1 or not hasattr(changes[0], "range"):
+            return self.parse_document(doc)
+
+        change = changes[0]
+        start, end = change.range.start.line, change.range.end.line
+        stop = start + len(utils.NEWLINE_RE.findall(change.text)) + 1
+        cached[start : end + 1] = [
+            self._parse_line(line) for line in utils.iter_lines(doc, start, stop)
+        ]
+        if len(cached) != utils.line_count(doc):
+            return self.parse_document(doc)  # edit touched the trailing line
+        return self._build_index(doc)
+
+    def _build_index(self, doc: workspace.TextDocument) -> IndexType:
+        """rebuilds the declaration index and the occurrences of every indexed
+        name of a document from `self.lines_`
+
+        args:
+            - `doc (workspace.TextDocument)`: parsed document
+        returns:
+            - `dict`: index of the document
+        """
+        index = {type_name: {} for type_name, _ in ampl_utils.PATTERNS}
+        for linum, (decls, _) in enumerate(self.lines_[doc.uri]):
+            for type_name, name, start, end in decls:
+                index[type_name][name] = lsp.Range(
+                    start=lsp.Position(line=linum, character=start),
+                    end=lsp.Position(line=linum, character=end),
                 )
-        self.log("Index: %s", self.index_)
+        self.index_[doc.uri] = index
+        self.names_[doc.uri] = indexed = frozenset().union(*index.values())
+        occurrences = {name: [] for name in indexed}
+        for linum, (_, words) in enumerate(self.lines_[doc.uri]):
+            for word, spans in words.items():
+                if (found := occurrences.get(word)) is not None:
+                    found.extend((linum, start, end) for start, end in spans)
+        self.occurrences_[doc.uri] = occurrences
+        # this runs on every change, skip building the message unless it is shown.
+        settings = self.get_settings_by_document(doc)
+        if settings is not None and self._should_log(settings):
+            counts = ", ".join(f"{len(names)} {name}" for name, names in index.items())
+            self.log("Indexed %s: %s", doc.uri, counts)
         return self.index_
 
+    def forget_document(self, doc: workspace.TextDocument) -> None:
+        """drops everything parsed or cached for a closed document
+
+        args:
+            - `doc (workspace.TextDocument)`: the closed document
+        """
+        self.lines_.pop(doc.uri, None)
+        self.names_.pop(doc.uri, None)
+        self.index_.pop(doc.uri, None)
+        self.occurrences_.pop(doc.uri, None)
+        self._settings_cache.pop(doc.path, None)
+
+    def update_global_settings(self, **settings: t.Any) -> None:
+        """update global settings
+
+        use this instead of mutating `GLOBAL_SETTINGS` so cached defaults, and the
+        per document settings built from them, are invalidated.
+
+        args:
+            - `settings (Any)`: settings to update
+        """
+        self.__class__.GLOBAL_SETTINGS.update(**settings)
+        self._globals_rev += 1
+        self._workspace_settings_rev += 1  # fallback settings embed the globals
+
     def get_global_defaults(self) -> dict[str, t.Any]:
         """get global settings
 
         returns:
-            - `dict`: global settings
+            - `dict`: global settings, a fresh copy the caller may modify, its
+                lists included
         """
-        _ref = self.__class__.GLOBAL_SETTINGS  # mem ref to global settings
+        cached = self._global_defaults
+        if cached is None or cached[0] != self._globals_rev:
+            _ref = self.__class__.GLOBAL_SETTINGS  # mem ref to global settings
+            self._global_defaults = (
+                self._globals_rev,
+                {
+                    "path": _ref.get("path", []),
+                    "interpreter": _ref.get("interpreter", [sys.executable]),
+                    "args": _ref.get("args", []),
+                    "importStrategy": _ref.get("importStrategy", "useBundled"),
+                    "showNotifications": _ref.get("showNotifications", "off"),
+                },
+            )
         return {
-            "path": _ref.get("path", []),
-            "interpreter": _ref.get("interpreter", [sys.executable]),
-            "args": _ref.get("args", []),
-            "importStrategy": _ref.get("importStrategy", "useBundled"),
-            "showNotifications": _ref.get("showNotifications", "off"),
+            key: list(value) if isinstance(value, list) else value
+            for key, value in self._global_defaults[1].items()
         }
 
     def update_workspace_settings(self, settings: list[dict[str, t.Any]]) -> None:
@@ -103,21 +238,35 @@ class AMPLServer(server.LanguageServer):
             - `settings (list[dict[str, Any]])`: settings to update
         """
         if not settings:
-            key = os.getcwd()
+            key = utils.SERVER_CWD
             self.__class__.WORKSPACE_SETTINGS[key] = {
                 "cwd": key,
                 "workspaceFS": key,
                 "workspace": uris.from_fs_path(key),
                 **self.get_global_defaults(),
             }
-            return
-        for _set in settings:
+        for _set in settings or []:
             key = uris.to_fs_path(_set["workspace"])
             self.__class__.WORKSPACE_SETTINGS[key] = {
                 "cwd": key,
                 **_set,
                 "workspaceFS": key,
             }
+        for entry in self.__class__.WORKSPACE_SETTINGS.values():
+            self._prepare_run_settings(entry)
+        # lookups read these instead of rebuilding them on every request.
+        # the trie maps path components to child nodes; `None` holds the key of
+        # a workspace rooted at that node.
+        self._ws_trie = {}
+        for key, entry in self.__class__.WORKSPACE_SETTINGS.items():
+            node = self._ws_trie
+            for part in os.path.normpath(entry["workspaceFS"]).split(os.sep):
+                node = node.setdefault(part, {})
+            node[None] = key
+        self._first_workspace_settings = next(
+            iter(self.__class__.WORKSPACE_SETTINGS.values()), None
+        )
+        self._workspace_settings_rev += 1
 
     def get_document_key(self, document: workspace.Document) -> str | None:
         """gets the document key
@@ -128,16 +277,25 @@ class AMPLServer(server.LanguageServer):
         """
 
         if self.WORKSPACE_SETTINGS:
-            document_workspace = pathlib.Path(document.path)
-            workspaces = {s["workspaceFS"] for s in self.WORKSPACE_SETTINGS.values()}
-
-            # Find workspace settings for the given file.
-            while document_workspace != document_workspace.parent:
-                if str(document_workspace) in workspaces:
-                    return str(document_workspace)
-                document_workspace = document_workspace.parent
+            return self._match_workspace(document.path)
         return None
 
+    def _match_workspace(self, path: str) -> str | None:
+        """finds the deepest workspace containing `path` with one trie descent.
+
+        args:
+            - `path (str)`: file system path
+        returns:
+            - `str | None`: the `WORKSPACE_SETTINGS` key, if any
+        """
+        found = None
+        node = self._ws_trie
+        for part in os.path.normpath(path).split(os.sep):
+            if (node := node.get(part)) is None:
+                break
+            found = node.get(None, found)
+        return found
+
     def get_settings_by_document(
         self, document: workspace.Document | None
     ) -> dict[str, t.Any]:
@@ -148,20 +306,30 @@ class AMPLServer(server.LanguageServer):
             - `returns`: settings
         """
         if document is None or document.path is None:
-            return list(self.WORKSPACE_SETTINGS.values())[0]
+            return self._first_workspace_settings
+
+        rev = self._workspace_settings_rev
+        cached = self._settings_cache.get(document.path)
+        if cached is not None and cached[0] == rev:
+            return cached[1]
 
         key = self.get_document_key(document)
         if key is None:
             # This is either a non-workspace file or there is no workspace.
-            key = os.fspath(pathlib.Path(document.path).parent)
-            return {
-                "cwd": key,
-                "workspaceFS": key,
-                "workspace": uris.from_fs_path(key),
-                **self.get_global_defaults(),
-            }
+            key = os.path.dirname(document.path)
+            settings = self._prepare_run_settings(
+                {
+                    "cwd": key,
+                    "workspaceFS": key,
+                    "workspace": uris.from_fs_path(key),
+                    **self.get_global_defaults(),
+                }
+            )
+        else:
+            settings = self.WORKSPACE_SETTINGS[str(key)]
 
-        return self.WORKSPACE_SETTINGS[str(key)]
+        self._settings_cache[document.path] = (rev, settings)
+        return settings
 
     def get_settings_by_path(self, file_path: pathlib.Path) -> dict[str, t.Any]:
         """get settings by path
@@ -170,18 +338,40 @@ class AMPLServer(server.LanguageServer):
             - `file_path (pathlib.Path)`: file path
         """
 
-        workspaces = {
-            s["workspaceFS"] for s in self.__class__.WORKSPACE_SETTINGS.values()
-        }
+        if (key := self._match_workspace(os.fspath(file_path))) is not None:
+            return self.__class__.WORKSPACE_SETTINGS[key]
+        return self._first_workspace_settings
 
-        while file_path != file_path.parent:
-            str_file_path = str(file_path)
-            if str_file_path in workspaces:
-                return self.__class__.WORKSPACE_SETTINGS[str_file_path]
-            file_path = file_path.parent
+    def _prepare_run_settings(self, settings: dict[str, t.Any]) -> dict[str, t.Any]:
+        """precomputes how the tool is run for a settings entry, in place.
 
-        setting_values = list(self.__class__.WORKSPACE_SETTINGS.values())
-        return setting_values[0]
+        sets `_mode` (`"path"`, `"rpc"` or `"module"`), `_argv_base` (the
+        executable or module) and `_argv_prefix` (base + tool and user args).
+
+        args:
+            - `settings (dict[str, Any])`: settings entry to update
+        returns:
+            - `dict[str, Any]`: the same entry
+        """
+        if settings["path"]:
+            # 'path' setting takes priority over everything.
+            mode, base = "path", tuple(settings["path"])
+        elif settings["interpreter"] and not utils.is_current_interpreter(
+            settings["interpreter"][0]
+        ):
+            # If there is a different interpreter set use JSON-RPC to the subprocess
+            # running under that interpreter.
+            mode, base = "rpc", (self.module,)
+        else:
+            # if the interpreter is same as the interpreter running this
+            # process then run as module.
+            mode, base = "module", (self.module,)
+        settings["_mode"] = mode
+        settings["_argv_base"] = base
+        settings["_argv_prefix"] = (
+            base + tuple(self.tool_args) + tuple(settings["args"])
+        )
+        return settings
 
     def run_tool_on_document(
         self,
@@ -199,31 +389,17 @@ class AMPLServer(server.LanguageServer):
         if str(document.uri).startswith("vscode-notebook-cell"):
             return None
 
-        # deep copy here to prevent accidentally updating global settings.
-        settings = copy.deepcopy(self.get_settings_by_document(document))
+        # settings are shared, only read from them past this point.
+        settings = self.get_settings_by_document(document)
+        verbose = self._should_log(settings)
 
         code_workspace = settings["workspaceFS"]
         cwd = settings["cwd"]
 
-        use_path = False
-        use_rpc = False
-        if settings["path"]:
-            # 'path' setting takes priority over everything.
-            use_path = True
-            argv = settings["path"]
-        elif settings["interpreter"] and not utils.is_current_interpreter(
-            settings["interpreter"][0]
-        ):
-            # If there is a different interpreter set use JSON-RPC to the subprocess
-            # running under that interpreter.
-            argv = [self.module]
-            use_rpc = True
-        else:
-            # if the interpreter is same as the interpreter running this
-            # process then run as module.
-            argv = [self.module]
-
-        argv += self.tool_args + settings["args"] + extra_args
+        use_path = settings["_mode"] == "path"
+        use_rpc = settings["_mode"] == "rpc"
+        argv = list(settings["_argv_prefix"])
+        argv += extra_args
 
         if use_stdin:
             # TODO: update these to pass the appropriate arguments to provide document contents
@@ -238,25 +414,30 @@ class AMPLServer(server.LanguageServer):
             # set use_stdin to False, or provide path, what ever is appropriate for your tool.
             argv += []
         else:
-            argv += [document.path]
+            argv.append(document.path)
 
         if use_path:
             # This mode is used when running executables.
-            self.log(" ".join(argv))
-            self.log(f"CWD Server: {cwd}")
+            if verbose:
+                self.log(" ".join(argv))
+                self.log(f"CWD Server: {cwd}")
+            source = document.source
+            if "\r" in source:  # skip the copy for the common LF-only document
+                source = source.replace("\r\n", "\n")
             result = utils.run_path(
                 argv=argv,
                 use_stdin=use_stdin,
                 cwd=cwd,
-                source=document.source.replace("\r\n", "\n"),
+                source=source,
             )
             if result.stderr:
                 self.log(result.stderr)
         elif use_rpc:
             # This mode is used if the interpreter running this server is different from
             # the interpreter used for running this server.
-            self.log(" ".join(settings["interpreter"] + ["-m"] + argv))
-            self.log(f"CWD Linter: {cwd}")
+            if verbose:
+                self.log(" ".join(settings["interpreter"] + ["-m"] + argv))
+                self.log(f"CWD Linter: {cwd}")
 
             result = utils.run_over_json_rpc(
                 workspace=code_workspace,
@@ -268,14 +449,15 @@ class AMPLServer(server.LanguageServer):
                 source=document.source,
             )
             if result.exception:
-                self.log(result.exception, lsp.MessageType.Error)
+                self.log(result.exception, msg_type=lsp.MessageType.Error)
                 result = utils.RunResult(result.stdout, result.stderr)
             elif result.stderr:
                 self.log(result.stderr)
         else:
             # In this mode the tool is run as a module in the same process as the language server.
-            self.log(" ".join([sys.executable, "-m"] + argv))
-            self.log(f"CWD Linter: {cwd}")
+            if verbose:
+                self.log(" ".join([sys.executable, "-m"] + argv))
+                self.log(f"CWD Linter: {cwd}")
             # This is needed to preserve sys.path, in cases where the tool modifies
             # sys.path and that might not work for this scenario next time around.
             with utils.substitute_attr(sys, "path", sys.path[:]):
@@ -293,7 +475,9 @@ class AMPLServer(server.LanguageServer):
                         source=document.source,
                     )
                 except Exception:
-                    self.log(traceback.format_exc(chain=True), lsp.MessageType.Error)
+                    self.log(
+                        traceback.format_exc(chain=True), msg_type=lsp.MessageType.Error
+                    )
                     raise
             if result.stderr:
                 self.log(result.stderr)
@@ -303,44 +487,32 @@ class AMPLServer(server.LanguageServer):
 
     def run_tool(self, extra_args: t.Sequence[str]) -> utils.RunResult:
         """Runs tool."""
-        # deep copy here to prevent accidentally updating global settings.
-        settings = copy.deepcopy(self.get_settings_by_document(None))
+        # settings are shared, only read from them past this point.
+        settings = self.get_settings_by_document(None)
+        verbose = self._should_log(settings)
 
         code_workspace = settings["workspaceFS"]
         cwd = settings["workspaceFS"]
 
-        use_path = False
-        use_rpc = False
-        if len(settings["path"]) > 0:
-            # 'path' setting takes priority over everything.
-            use_path = True
-            argv = settings["path"]
-        elif len(settings["interpreter"]) > 0 and not utils.is_current_interpreter(
-            settings["interpreter"][0]
-        ):
-            # If there is a different interpreter set use JSON-RPC to the subprocess
-            # running under that interpreter.
-            argv = [self.module]
-            use_rpc = True
-        else:
-            # if the interpreter is same as the interpreter running this
-            # process then run as module.
-            argv = [self.module]
-
+        use_path = settings["_mode"] == "path"
+        use_rpc = settings["_mode"] == "rpc"
+        argv = list(settings["_argv_base"])
         argv += extra_args
 
         if use_path:
             # This mode is used when running executables.
-            self.log(" ".join(argv))
-            self.log(f"CWD Server: {cwd}")
+            if verbose:
+                self.log(" ".join(argv))
+                self.log(f"CWD Server: {cwd}")
             result = utils.run_path(argv=argv, use_stdin=True, cwd=cwd)
             if result.stderr:
                 self.log(result.stderr)
         elif use_rpc:
             # This mode is used if the interpreter running this server is different from
             # the interpreter used for running this server.
-            self.log(" ".join(settings["interpreter"] + ["-m"] + argv))
-            self.log(f"CWD Linter: {cwd}")
+            if verbose:
+                self.log(" ".join(settings["interpreter"] + ["-m"] + argv))
+                self.log(f"CWD Linter: {cwd}")
             result = utils.run_over_json_rpc(
                 workspace=code_workspace,
                 interpreter=settings["interpreter"],
@@ -350,14 +522,15 @@ class AMPLServer(server.LanguageServer):
                 cwd=cwd,
             )
             if result.exception:
-                self.log(result.exception, lsp.MessageType.Error)
+                self.log(result.exception, msg_type=lsp.MessageType.Error)
                 result = utils.RunResult(result.stdout, result.stderr)
             elif result.stderr:
                 self.log(result.stderr)
         else:
             # In this mode the tool is run as a module in the same process as the language server.
-            self.log(" ".join([sys.executable, "-m"] + argv))
-            self.log(f"CWD Linter: {cwd}")
+            if verbose:
+                self.log(" ".join([sys.executable, "-m"] + argv))
+                self.log(f"CWD Linter: {cwd}")
             # This is needed to preserve sys.path, in cases where the tool modifies
             # sys.path and that might not work for this scenario next time around.
             with utils.substitute_attr(sys, "path", sys.path[:]):
@@ -370,7 +543,9 @@ class AMPLServer(server.LanguageServer):
                         module=self.module, argv=argv, use_stdin=True, cwd=cwd
                     )
                 except Exception:
-                    self.log(traceback.format_exc(chain=True), lsp.MessageType.Error)
+                    self.log(
+                        traceback.format_exc(chain=True), msg_type=lsp.MessageType.Error
+                    )
                     raise
             if result.stderr:
                 self.log(result.stderr)
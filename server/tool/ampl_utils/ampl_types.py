@@ -1,16 +1,73 @@
 """classes for AMPL types"""
 
+import functools
 import re
+import sys
 
 import typing as t
 
 
+@functools.cache
+def _re2() -> t.Any:
+    """gets the optional `google-re2` module, if it is installed."""
+    try:
+        import re2  # pylint: disable=import-outside-toplevel,import-error
+
+        return re2
+    except ImportError:
+        return None
+
+
+def compile_fast(pattern: str) -> re.Pattern:
+    """compiles a pattern with re2's linear time engine when available.
+
+    falls back to `re` if re2 is missing or rejects the pattern (lookarounds).
+    the fallback is compiled with `re.ASCII`, re2's `\\w` and `\\b` are ascii only
+    and both engines must find the same matches.
+
+    args:
+        - `pattern (str)`: the regex pattern
+    returns:
+        - `re.Pattern`: a compiled pattern with the `re` match api
+    """
+    if (re2 := _re2()) is not None:
+        try:
+            return re2.compile(pattern)
+        except Exception:  # pylint: disable=broad-except
+            pass
+    return re.compile(pattern, re.ASCII)
+
+
+# an AMPL identifier, shared by every pattern that captures a name. spelled out
+# in ascii, `\w` is unicode aware and would disagree with `word_at_position`.
+IDENT_RE: re.Pattern = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
 class TypeBase:
     """abstract base class for AMPL types"""
 
-    type_name: str
-    regex: re.Pattern
+    __slots__ = ("value",)
+
+    type_name: t.ClassVar[str]
+    regex: t.ClassVar[re.Pattern]
     iterable: bool = False
+    display_name: str = "Any"  # name displayed to the user, set per class
+
+    def __init_subclass__(cls, **kwargs: t.Any) -> None:
+        """precomputes `display_name`, interns `type_name` and registers each
+        subclass with its parents.
+
+        a class that gets subclassed is abstract, so it is displayed as `Any`.
+        """
+        super().__init_subclass__(**kwargs)
+        if "type_name" in cls.__dict__:
+            cls.type_name = sys.intern(cls.type_name)
+        cls.display_name = f"{cls.type_name}[]" if cls.iterable else cls.type_name
+        for base in cls.__bases__:
+            if issubclass(base, TypeBase):
+                base.display_name = "Any"
+                base._registry = base.__dict__.get("_registry", ()) + (cls,)
+                base._dispatcher = None  # rebuilt with the new subclass
 
     def __init__(self, value: str | t.Any = None) -> None:
         """initialize an object that represents one instance of an ampl primitive
@@ -23,15 +80,6 @@ class TypeBase:
     def __repr__(self) -> str:
         return f"<Ampl{self.__class__.__name__}({self.value})>"
 
-    @property
-    def display_name(self) -> str:
-        """name displayed to the user"""
-        if self.__class__.__subclasses__():
-            return "Any"
-        if self.iterable:
-            return f"{self.type_name}[]"
-        return self.type_name
-
     @classmethod
     def parse_type(cls, value: str) -> t.Self:
         """parses the type of the primitive
@@ -42,24 +90,54 @@ class TypeBase:
             - `t.Self`: an instance of the primitive, falls back to Primitive
         """
 
-        classes = cls.__subclasses__()
-        if parents := [c for c in cls.__bases__ if c is not object]:
-            classes += [b for a in parents for b in a.__subclasses__()]
-        for _sub in cls.__subclasses__():
-            if _sub.regex.match(value):
-                return _sub(value)
+        combined, dispatch = cls._build_dispatcher()
+        if combined is not None and (match := combined.match(value)):
+            return dispatch[match.lastgroup](value)
         return cls(value)
 
+    @classmethod
+    def _build_dispatcher(
+        cls,
+    ) -> tuple[re.Pattern | None, dict[str, t.Type["TypeBase"]]]:
+        """folds the regexes of every direct subclass into one alternation.
+
+        the result is cached on the class and reset when a subclass is added.
+
+        returns:
+            - `tuple[re.Pattern | None, dict]`: the combined regex and a map of
+                group name to subclass
+        """
+        if (cached := cls.__dict__.get("_dispatcher")) is not None:
+            return cached
+
+        items = [
+            (_sub.__name__, _sub.regex.pattern, _sub)
+            for _sub in cls.__dict__.get("_registry", ())
+            if getattr(_sub, "regex", None) is not None
+        ]
+        combined = None
+        if items:
+            combined = compile_fast(
+                "|".join(f"(?P<{name}>{pattern})" for name, pattern, _ in items)
+            )
+        dispatch = {name: _sub for name, _, _sub in items}
+        cls._dispatcher = (combined, dispatch)
+        return combined, dispatch
+
 
 class Primitive(TypeBase):
     """abstract base class for AMPL primitives"""
 
+    __slots__ = ()
+
     type_name: str = "primitive"
 
 
 class Number(Primitive):
     """class for any number"""
 
+    __slots__ = ()
+
     type_name: str = "number"
     regex: re.Pattern = re.compile(r"\b([0-9]+(\.[0-9]+)?)")
 
@@ -69,15 +147,23 @@ class Symbolic(Primitive):
 
     why is it called symbolic"""
 
+    __slots__ = ()
+
     type_name: str = "symbolic"
-    regex: re.Pattern = re.compile(r"\b([a-zA-Z_][a-zA-Z0-9_]*)")
+    regex: re.Pattern = re.compile(rf"\b({IDENT_RE.pattern})")
+
+
+# build the `Primitive.parse_type` dispatcher once every primitive is defined.
+Primitive._build_dispatcher()  # pylint: disable=protected-access
 
 
 class DeclaredType(TypeBase):
     """class for declared types"""
 
+    __slots__ = ("subtype",)
+
     type_name: str = "declared_type"
-    identifier: str
+    identifier: t.ClassVar[str]
 
     def __init__(self, value: str, subtype: t.Type[Primitive] = None) -> None:
         """initialize an AMPLSet object
@@ -95,6 +181,8 @@ class DeclaredType(TypeBase):
 class Set(DeclaredType):
     """set of array in AMPL"""
 
+    __slots__ = ()
+
     type_name: str = "set"
     identifier: str = "set"
     iterable: bool = True
@@ -103,89 +191,115 @@ class Set(DeclaredType):
 class Objective(DeclaredType):
     """the object of the model, can be maximized or minimized"""
 
+    __slots__ = ()
+
 
 class Constraint(DeclaredType):
     """a constraint in the model"""
 
+    __slots__ = ()
 
-# class Variable:
-#     """class for AMPL variables"""
 
-#     regex: re.Pattern = re.compile(
-#         r"^(arc|maximize|minimize|node|param|set|function|subj to|s\.t\.|subject\sto|var)\s(?![if|and|or])([a-zA-Z_][a-zA-Z0-9_]*)"
-#     )
+class Argument(TypeBase):
+    """class for AMPL arguments"""
 
-#     def __init__(self, raw: str) -> None:
-#         """initialize an AMPLVariable object
+    __slots__ = ()
 
-#         args:
-#             - `raw (str)`: the raw string from the AMPL file
-#         """
-#         _match = self.regex.match(raw)
-#         value = self.regex.match(raw).group(2)
-#         self.name = name
-#         self.declaration = declaration
-#         self.type = type_
+    type_name: str = "argument"
+    regex: re.Pattern = re.compile(
+        rf"(?P<name>{IDENT_RE.pattern}): (?P<type>{IDENT_RE.pattern})"
+    )
 
 
-# class DeclaredType(Primitive):
-#     """class for declared types"""
+class Function(TypeBase):
+    """class for AMPL functions"""
 
+    __slots__ = ()
 
-#     type_name: str = "set"
-#     identifier: str = "set"
-#     iterable: bool = False
+    type_name: str = "function"
+    regex: re.Pattern = re.compile(r"^function ([a-z][A-Za-z0-9_]+)\(")
 
-#     def __init__(self, value: str, subtype: t.Type[Primitive] = None) -> None:
-#         """initialize an AMPLSet object
 
-#         args:
-#             - `value (str)`: the value of the set
-#         """
-#         super().__init__(value)
-#         self.subtype: str = subtype
+class Variable(TypeBase):
+    """class for declared AMPL names (params, sets, variables, objectives, ...)"""
 
-#     def __repr__(self) -> str:
-#         return f"<Ampl{__class__.__name__}({self.subtype.__class__.__name__}[])>"
+    __slots__ = ()
 
+    type_name: str = "variable"
+    # possessive quantifiers keep malformed lines from backtracking; the name
+    # stays group 1, like the other declaration patterns.
+    regex: re.Pattern = re.compile(
+        r"^(?:arc|maximize|minimize|node|param|set|function|subj\s+to|s\.t\.|subject\s+to|var)"
+        rf"\s++(?!(?:if|and|or)\b)({IDENT_RE.pattern})"
+    )
 
-# class Set(Primitive):
-#     """a class representing a set or array in AMPL"""
 
-#     type_name: str = "set"
-#     identifier = "set"
-#     regex: re.Pattern = re.compile(r"^set ([a-z]\w+)")
-#     iterable = True
+# any identifier, used to index every occurrence of a name in a document. this
+# runs over every line on every change, so it prefers re2's linear time engine.
+WORD_RE: re.Pattern = compile_fast(rf"\b{IDENT_RE.pattern}")
 
-#     def __init__(self, value: str, subtype: t.Type[Symbolic | Number] = None) -> None:
-#         """initialize an AMPLSet object
+# (type_name, regex) for every declaration that is indexed per line; the regex
+# captures the declared name as group 1.
+PATTERNS: tuple[tuple[str, re.Pattern], ...] = tuple(
+    (_cls.type_name, _cls.regex) for _cls in (Variable, Function)
+)
 
-#         args:
-#             - `value (str)`: the value of the set
-#         """
-#         super().__init__(value)
-#         self.subtype: str = subtype
+# every pattern in `PATTERNS` as one alternation, grouped by type name.
+COMBINED: re.Pattern = re.compile(
+    "|".join(f"(?P<{type_name}>{regex.pattern})" for type_name, regex in PATTERNS)
+)
 
-#     def __repr__(self) -> str:
-#         return f"<Ampl{__class__.__name__}({self.subtype.__class__.__name__}[])>"
 
+def match_token(line: str) -> tuple[str, re.Match] | None:
+    """matches `line` against every declaration pattern in one pass.
 
-# class Set(TypeBase):
-#     """class for AMPL sets"""
+    only the first matching pattern is reported; use `scan_line` for all of them.
 
-#     type_name: str = "set"
-#     regex: re.Pattern = re.compile(r"^set ([a-z]\w+)")
+    args:
+        - `line (str)`: a single source line
+    returns:
+        - `tuple[str, re.Match] | None`: the type name and the combined match
+    """
+    if (match := COMBINED.match(line)) is None:
+        return None
+    return match.lastgroup, match
 
 
-class Argument(TypeBase):
-    """class for AMPL arguments"""
+def scan_line(line: str) -> t.Iterator[tuple[str, re.Match]]:
+    """yields every declaration pattern matching the start of `line`.
 
-    type_name: str = "argument"
-    regex: re.Pattern = re.compile(r"(?P<name>\w+): (?P<type>\w+)")
+    args:
+        - `line (str)`: a single source line
+    yields:
+        - `tuple[str, re.Match]`: the type name and its match
+    """
+    if COMBINED.match(line) is None:
+        return  # most lines declare nothing, reject them with one regex call
+    for type_name, regex in PATTERNS:
+        if (match := regex.match(line)) is not None:
+            yield type_name, match
 
 
-class Function(TypeBase):
-    """class for AMPL functions"""
+# every type with a regex as one named alternation, tried in this order.
+_TOKEN_TYPES: dict[str, t.Type[TypeBase]] = {
+    _cls.__name__: _cls for _cls in (Variable, Function, Argument, Number, Symbolic)
+}
+TOKENS: re.Pattern = re.compile(
+    "|".join(f"(?P<{name}>{_cls.regex.pattern})" for name, _cls in _TOKEN_TYPES.items())
+)
 
-    type_name: str = "function"
-    regex: re.Pattern = re.compile(r"^function ([a-z]\w+)\(")
+
+def classify(text: str) -> t.Iterator[tuple[t.Type[TypeBase], re.Match]]:
+    """tokenizes `text` in a single regex pass.
+
+    tokens don't overlap and the first type in `_TOKEN_TYPES` wins, so a
+    declaration consumes the names inside it; `scan_line` and `WORD_RE` are
+    what the document index uses.
+
+    args:
+        - `text (str)`: source text, usually one line
+    yields:
+        - `tuple[type[TypeBase], re.Match]`: the token type and its match
+    """
+    for match in TOKENS.finditer(text):
+        yield _TOKEN_TYPES[match.lastgroup], match
@@ -3,11 +3,9 @@
 import json
 import os
 import pathlib
-import re
 import sys
 import typing as t
 
-import ampl_utils
 import utils
 
 utils.update_sys_path(
@@ -15,6 +13,7 @@ utils.update_sys_path(
     os.getenv("LS_IMPORT_STRATEGY", "useBundled"),
 )
 
+import ampl_utils  # may use bundled libs, import after sys.path is updated
 import lsprotocol.types as lsp
 from ampl_lsp import AMPLServer
 
@@ -22,6 +21,7 @@ RUNNER = pathlib.Path(__file__).parent / "lsp_runner.py"
 
 TOOL_ARGS = []  # default arguments always passed to your tool.
 
+
 LSP_SERVER = AMPLServer(
     module="ampl-lsp", name="ampl language server", tool_args=TOOL_ARGS, version="0.1.0"
 )
@@ -30,19 +30,21 @@ LSP_SERVER = AMPLServer(
 # **********************************************************
 # Required Language Server Initialization and Exit handlers.
 # **********************************************************
-@LSP_SERVER.feature(lsp.INITIALIZE)
 def initialize(params: lsp.InitializeParams) -> None:
     """LSP handler for initialize request."""
     LSP_SERVER.log(f"CWD Server: {os.getcwd()}")
 
-    paths = "\r\n   ".join(sys.path)
-    LSP_SERVER.log(f"sys.path used to run Server:\r\n   {paths}")
-
-    LSP_SERVER.GLOBAL_SETTINGS.update(
+    LSP_SERVER.update_global_settings(
         **params.initialization_options.get("globalSettings", {})
     )
     settings = params.initialization_options["settings"]
     LSP_SERVER.update_workspace_settings(settings)
+
+    # these dumps can be large, only build them when the user wants details.
+    if LSP_SERVER.GLOBAL_SETTINGS.get("showNotifications", "off") == "off":
+        return
+    paths = "\r\n   ".join(sys.path)
+    LSP_SERVER.log(f"sys.path used to run Server:\r\n   {paths}")
     LSP_SERVER.log(
         f"Settings used to run Server:\r\n{json.dumps(settings, indent=4, ensure_ascii=False)}\r\n"
     )
@@ -51,71 +53,69 @@ def initialize(params: lsp.InitializeParams) -> None:
     )
 
 
-@LSP_SERVER.feature(lsp.TEXT_DOCUMENT_DID_CLOSE)
 def did_close(params: lsp.DidCloseTextDocumentParams) -> None:
     """LSP handler for textDocument/didClose request."""
     document = LSP_SERVER.workspace.get_document(params.text_document.uri)
+    utils.forget_document(document.uri)
+    LSP_SERVER.forget_document(document)
     # Publishing empty diagnostics to clear the entries for this file.
     LSP_SERVER.publish_diagnostics(document.uri, [])
 
 
-@LSP_SERVER.feature(lsp.TEXT_DOCUMENT_DID_OPEN)
 def did_open(ls: AMPLServer, params: lsp.DidOpenTextDocumentParams):
     """Parse each document when it is opened"""
     doc = ls.workspace.get_text_document(params.text_document.uri)
     ls.parse_document(doc)
 
 
-@LSP_SERVER.feature(lsp.TEXT_DOCUMENT_DID_CHANGE)
-def did_change(ls: AMPLServer, params: lsp.DidOpenTextDocumentParams):
-    """Parse each document when it is changed"""
+def did_change(ls: AMPLServer, params: lsp.DidChangeTextDocumentParams):
+    """Re-parse the changed lines of each document"""
     doc = ls.workspace.get_text_document(params.text_document.uri)
-    ls.parse_document(doc)
+    ls.parse_changes(doc, params.content_changes)
 
 
-@LSP_SERVER.feature(lsp.EXIT)
 def on_exit(_params: t.Optional[t.Any] = None) -> None:
     """Handle clean up on exit."""
     utils.shutdown_json_rpc()
 
 
-@LSP_SERVER.feature(lsp.SHUTDOWN)
 def on_shutdown(_params: t.Optional[t.Any] = None) -> None:
     """Handle clean up on shutdown."""
     utils.shutdown_json_rpc()
 
 
-@LSP_SERVER.feature(
-    lsp.TEXT_DOCUMENT_COMPLETION,
-    lsp.CompletionOptions(trigger_characters=["."]),
+# responses are the same on every request, so they are built once and shared.
+_EMPTY_COMPLETIONS = lsp.CompletionList(is_incomplete=False, items=[])
+_HELLO_COMPLETIONS = lsp.CompletionList(
+    is_incomplete=False,
+    items=[lsp.CompletionItem(label="world"), lsp.CompletionItem(label="friend")],
 )
+_HELLO_HOVER = lsp.Hover(
+    contents=[
+        lsp.MarkedString_Type1(
+            language="markdown",
+            value="This is a hover message for `hello`.",
+        )
+    ]
+)
+
+
 def completions(params: lsp.CompletionParams) -> lsp.CompletionList:
     """LSP handler for textDocument/completion request."""
     document = LSP_SERVER.workspace.get_document(params.text_document.uri)
-    current_line = document.lines[params.position.line].strip()
-    if not current_line.endswith("hello."):
-        return []
-    return [
-        lsp.CompletionItem(label="world"),
-        lsp.CompletionItem(label="friend"),
-    ]
+    tail = utils.get_line_tail(document, params.position.line)
+    if not tail.endswith("hello."):
+        return _EMPTY_COMPLETIONS
+    return _HELLO_COMPLETIONS
 
 
-@LSP_SERVER.feature(lsp.TEXT_DOCUMENT_HOVER)
 def hover(params: lsp.TextDocumentPositionParams) -> lsp.Hover | None:
     """LSP handler for textDocument/hover request."""
     document = LSP_SERVER.workspace.get_document(params.text_document.uri)
-    current_line = document.lines[params.position.line].strip()
-    if not current_line.endswith("hello."):
+    tail = utils.get_line_tail(document, params.position.line)
+    if not tail.endswith("hello."):
         return None
-    return lsp.Hover(
-        contents=[
-            lsp.MarkedString(
-                language="markdown",
-                value="This is a hover message for `hello`.",
-            )
-        ]
-    )
+    return _HELLO_HOVER
 
 
 # @LSP_SERVER.feature(lsp.TEXT_DOCUMENT_TYPE_DEFINITION)
@@ -139,7 +139,6 @@ def hover(params: lsp.TextDocumentPositionParams) -> lsp.Hover | None:
 #             return lsp.Location(uri=doc.uri, range=range_)
 
 
-@LSP_SERVER.feature(lsp.TEXT_DOCUMENT_DEFINITION)
 def goto_definition(ls: AMPLServer, params: lsp.DefinitionParams):
     """Jump to an object's definition."""
     doc = ls.workspace.get_text_document(params.text_document.uri)
@@ -147,14 +146,13 @@ def goto_definition(ls: AMPLServer, params: lsp.DefinitionParams):
     if index is None:
         return
 
-    word = doc.word_at_position(params.position)
+    word = utils.word_at_position(doc, params.position)
 
     # Is word a type?
     if (range_ := index["variable"].get(word, None)) is not None:
         return lsp.Location(uri=doc.uri, range=range_)
 
 
-@LSP_SERVER.feature(lsp.TEXT_DOCUMENT_DECLARATION)
 def goto_declaration(ls: AMPLServer, params: lsp.DeclarationParams):
     """Jump to an object's declaration."""
     doc = ls.workspace.get_text_document(params.text_document.uri)
@@ -162,12 +160,10 @@ def goto_declaration(ls: AMPLServer, params: lsp.DeclarationParams):
     if index is None:
         return
 
-    try:
-        line = doc.lines[params.position.line]
-    except IndexError:
-        line = ""
-
-    word = doc.word_at_position(params.position)
+    line = utils.get_line(doc, params.position.line)
+    word = utils.word_at_position(doc, params.position)
+    if ampl_utils.IDENT_RE.fullmatch(word) is None:
+        return
 
     for match in ampl_utils.Argument.regex.finditer(line):
         if match.group("name") == word:
@@ -181,7 +177,6 @@ def goto_declaration(ls: AMPLServer, params: lsp.DeclarationParams):
             )
 
 
-@LSP_SERVER.feature(lsp.TEXT_DOCUMENT_IMPLEMENTATION)
 def goto_implementation(ls: AMPLServer, params: lsp.ImplementationParams):
     """Jump to an object's implementation."""
     doc = ls.workspace.get_text_document(params.text_document.uri)
@@ -189,14 +184,13 @@ def goto_implementation(ls: AMPLServer, params: lsp.ImplementationParams):
     if index is None:
         return
 
-    word = doc.word_at_position(params.position)
+    word = utils.word_at_position(doc, params.position)
 
     # Is word a function?
     if (range_ := index["function"].get(word, None)) is not None:
         return lsp.Location(uri=doc.uri, range=range_)
 
 
-@LSP_SERVER.feature(lsp.TEXT_DOCUMENT_REFERENCES)
 def find_references(ls: AMPLServer, params: lsp.ReferenceParams):
     """Find references of an object."""
     doc = ls.workspace.get_text_document(params.text_document.uri)
@@ -204,27 +198,48 @@ def find_references(ls: AMPLServer, params: lsp.ReferenceParams):
     if index is None:
         return
 
-    word = doc.word_at_position(params.position)
-    is_object = any([word in index[name] for name in index])
-    if not is_object:
+    word = utils.word_at_position(doc, params.position)
+    occurrences = ls.occurrences_.get(doc.uri, {}).get(word)
+    if occurrences is None:
         return
 
-    references = []
-    for linum, line in enumerate(doc.lines):
-        for match in re.finditer(f"\\b{word}\\b", line):
-            references.append(
-                lsp.Location(
-                    uri=doc.uri,
-                    range=lsp.Range(
-                        start=lsp.Position(line=linum, character=match.start()),
-                        end=lsp.Position(line=linum, character=match.end()),
-                    ),
-                )
-            )
+    references = [
+        lsp.Location(
+            uri=doc.uri,
+            range=lsp.Range(
+                start=lsp.Position(line=linum, character=start),
+                end=lsp.Position(line=linum, character=end),
+            ),
+        )
+        for linum, start, end in occurrences
+    ]
 
     return references
 
 
+# every handler with its feature name and options, registered in one pass.
+HANDLERS: tuple[tuple[str, t.Any, t.Callable], ...] = (
+    (lsp.INITIALIZE, None, initialize),
+    (lsp.TEXT_DOCUMENT_DID_CLOSE, None, did_close),
+    (lsp.TEXT_DOCUMENT_DID_OPEN, None, did_open),
+    (lsp.TEXT_DOCUMENT_DID_CHANGE, None, did_change),
+    (lsp.EXIT, None, on_exit),
+    (lsp.SHUTDOWN, None, on_shutdown),
+    (
+        lsp.TEXT_DOCUMENT_COMPLETION,
+        lsp.CompletionOptions(trigger_characters=["."]),
+        completions,
+    ),
+    (lsp.TEXT_DOCUMENT_HOVER, None, hover),
+    (lsp.TEXT_DOCUMENT_DEFINITION, None, goto_definition),
+    (lsp.TEXT_DOCUMENT_DECLARATION, None, goto_declaration),
+    (lsp.TEXT_DOCUMENT_IMPLEMENTATION, None, goto_implementation),
+    (lsp.TEXT_DOCUMENT_REFERENCES, None, find_references),
+)
+for _feature, _options, _handler in HANDLERS:
+    LSP_SERVER.feature(_feature, _options)(_handler)
+
+
 # *****************************************************
 # Start the LSP_SERVER.
 # *****************************************************
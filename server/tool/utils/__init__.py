@@ -2,4 +2,5 @@
 
 from .general import *
 from .lsp_jsonrpc import *
+from .lsp_parsing import *
 from .lsp_utils import *
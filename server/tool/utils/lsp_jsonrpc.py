@@ -9,11 +9,14 @@ import subprocess
 import threading
 import uuid
 from concurrent.futures import ThreadPoolExecutor
-from typing import BinaryIO, Dict, Optional, Sequence, Union
+from typing import BinaryIO, Dict, Optional, Sequence, Tuple, Union
 
 CONTENT_LENGTH = "Content-Length: "
 RUNNER_SCRIPT = str(pathlib.Path(__file__).parent.parent / "lsp_runner.py")
 
+# runner processes are kept per (workspace, interpreter) pair.
+ProcessKey = Tuple[str, Tuple[str, ...]]
+
 
 def to_str(text) -> str:
     """Convert bytes to string as needed."""
@@ -120,9 +123,9 @@ class ProcessManager:
     """Manages sub-processes launched for running tools."""
 
     def __init__(self):
-        self._args: Dict[str, Sequence[str]] = {}
-        self._processes: Dict[str, subprocess.Popen] = {}
-        self._rpc: Dict[str, JsonRpc] = {}
+        self._args: Dict[ProcessKey, Sequence[str]] = {}
+        self._processes: Dict[ProcessKey, subprocess.Popen] = {}
+        self._rpc: Dict[ProcessKey, JsonRpc] = {}
         self._lock = threading.Lock()
         self._thread_pool = ThreadPoolExecutor(10)
 
@@ -133,7 +136,7 @@ class ProcessManager:
                 i.send_data({"id": str(uuid.uuid4()), "method": "exit"})
         self._thread_pool.shutdown(wait=False)
 
-    def start_process(self, workspace: str, args: Sequence[str], cwd: str) -> None:
+    def start_process(self, key: ProcessKey, args: Sequence[str], cwd: str) -> None:
         """Starts a process and establishes JSON-RPC communication over stdio."""
         # pylint: disable=consider-using-with
         proc = subprocess.Popen(
@@ -142,26 +145,26 @@ class ProcessManager:
             stdout=subprocess.PIPE,
             stdin=subprocess.PIPE,
         )
-        self._processes[workspace] = proc
-        self._rpc[workspace] = create_json_rpc(proc.stdout, proc.stdin)
+        self._processes[key] = proc
+        self._rpc[key] = create_json_rpc(proc.stdout, proc.stdin)
 
         def _monitor_process():
             proc.wait()
             with self._lock:
                 try:
-                    del self._processes[workspace]
-                    rpc = self._rpc.pop(workspace)
+                    del self._processes[key]
+                    rpc = self._rpc.pop(key)
                     rpc.close()
                 except:  # pylint: disable=bare-except
                     pass
 
         self._thread_pool.submit(_monitor_process)
 
-    def get_json_rpc(self, workspace: str) -> JsonRpc:
+    def get_json_rpc(self, key: ProcessKey) -> JsonRpc:
         """Gets the JSON-RPC wrapper for the a given id."""
         with self._lock:
-            if workspace in self._rpc:
-                return self._rpc[workspace]
+            if key in self._rpc:
+                return self._rpc[key]
         raise StreamClosedException()
 
 
@@ -169,9 +172,9 @@ _process_manager = ProcessManager()
 atexit.register(_process_manager.stop_all_processes)
 
 
-def _get_json_rpc(workspace: str) -> Union[JsonRpc, None]:
+def _get_json_rpc(key: ProcessKey) -> Union[JsonRpc, None]:
     try:
-        return _process_manager.get_json_rpc(workspace)
+        return _process_manager.get_json_rpc(key)
     except StreamClosedException:
         return None
     except KeyError:
@@ -181,12 +184,17 @@ def _get_json_rpc(workspace: str) -> Union[JsonRpc, None]:
 def get_or_start_json_rpc(
     workspace: str, interpreter: Sequence[str], cwd: str
 ) -> Union[JsonRpc, None]:
-    """Gets an existing JSON-RPC connection or starts one and return it."""
-    res = _get_json_rpc(workspace)
+    """Gets an existing JSON-RPC connection or starts one and return it.
+
+    The runner process is reused for every call with the same workspace and
+    interpreter, so interpreter start up is only paid once.
+    """
+    key = (workspace, tuple(interpreter))
+    res = _get_json_rpc(key)
     if not res:
         args = [*interpreter, RUNNER_SCRIPT]
-        _process_manager.start_process(workspace, args, cwd)
-        res = _get_json_rpc(workspace)
+        _process_manager.start_process(key, args, cwd)
+        res = _get_json_rpc(key)
     return res
 
 
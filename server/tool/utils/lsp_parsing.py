@@ -0,0 +1,157 @@
+"""helpers for reading text out of lsp documents without re-splitting them."""
+
+import array
+import re
+import typing as t
+
+# every line ending the lsp spec allows, `\r\n` first so it is not split in two
+NEWLINE_RE: re.Pattern = re.compile(r"\r\n|\r|\n")
+
+# uri -> (document version, start offset of every line)
+_LINE_OFFSETS: dict[str, tuple[int, array.array]] = {}
+
+# (uri, version, line, character) -> word, shared by the navigation handlers
+_WORDS: dict[tuple[str, int, int, int], str] = {}
+_WORDS_MAX = 256
+
+
+def line_offsets(document: t.Any) -> array.array:
+    """gets the start offset of every line in `document.source`.
+
+    lines end at `\r\n`, `\r` or `\n`, like positions sent by the client. the
+    table is cached per document version, so edits invalidate it. it is a flat
+    `array`, not a list of ints, so large documents stay cheap to index.
+
+    args:
+        - `document (workspace.TextDocument)`: document to index
+    returns:
+        - `array.array`: offset of the first character of each line
+    """
+    version = document.version
+    cached = _LINE_OFFSETS.get(document.uri)
+    if cached is not None and version is not None and cached[0] == version:
+        return cached[1]
+
+    offsets = array.array("L", (0,))
+    offsets.extend(match.end() for match in NEWLINE_RE.finditer(document.source))
+
+    if version is not None:
+        _LINE_OFFSETS[document.uri] = (version, offsets)
+    return offsets
+
+
+def _line_span(document: t.Any, line_no: int) -> tuple[int, int] | None:
+    """gets the `(start, end)` offsets of a line, `end` includes the line ending."""
+    offsets = line_offsets(document)
+    if not 0 <= line_no < len(offsets):
+        return None
+    if line_no + 1 < len(offsets):
+        return offsets[line_no], offsets[line_no + 1]
+    return offsets[line_no], len(document.source)
+
+
+def line_count(document: t.Any) -> int:
+    """counts the lines of a document, split at every lsp line ending.
+
+    args:
+        - `document (workspace.TextDocument)`: document to count
+    returns:
+        - `int`: number of lines, a trailing newline does not start a new one
+    """
+    offsets = line_offsets(document)
+    return len(offsets) - (offsets[-1] == len(document.source))
+
+
+def iter_lines(
+    document: t.Any, start: int = 0, stop: int | None = None
+) -> t.Iterator[str]:
+    """yields lines `start` to `stop` of a document, including their line endings.
+
+    only the requested lines are sliced out of `document.source`, unlike
+    `document.lines` which splits the whole document.
+
+    args:
+        - `document (workspace.TextDocument)`: document to read from
+        - `start (int)`: first line to yield
+        - `stop (int | None)`: line to stop before, defaults to the last line
+    yields:
+        - `str`: each line
+    """
+    source, offsets = document.source, line_offsets(document)
+    count = len(offsets) - (offsets[-1] == len(source))
+    stop = count if stop is None else min(stop, count)
+    for line_no in range(start, stop):
+        end = offsets[line_no + 1] if line_no + 1 < len(offsets) else len(source)
+        yield source[offsets[line_no] : end]
+
+
+def get_line(document: t.Any, line_no: int) -> str:
+    """gets a single line of a document, including its line ending.
+
+    args:
+        - `document (workspace.TextDocument)`: document to read from
+        - `line_no (int)`: zero based line number
+    returns:
+        - `str`: the line, or `""` if it is out of range
+    """
+    if (span := _line_span(document, line_no)) is None:
+        return ""
+    return document.source[span[0] : span[1]]
+
+
+def get_line_tail(document: t.Any, line_no: int, size: int = 32) -> str:
+    """gets up to `size` characters from the end of a line.
+
+    trailing whitespace is skipped, so suffix checks see the same text as
+    `line.strip().endswith(...)` without copying the whole line.
+
+    args:
+        - `document (workspace.TextDocument)`: document to read from
+        - `line_no (int)`: zero based line number
+        - `size (int)`: maximum number of characters to return
+    returns:
+        - `str`: the end of the line, or `""` if it is out of range
+    """
+    if (span := _line_span(document, line_no)) is None:
+        return ""
+    source = document.source
+    start, end = span
+    while end > start and source[end - 1].isspace():
+        end -= 1
+    return source[max(start, end - size) : end]
+
+
+def word_at_position(document: t.Any, position: t.Any) -> str:
+    """gets the word under `position`, cached per document version.
+
+    one hover fires several navigation requests at the same position, this lets
+    them share a single lookup.
+
+    args:
+        - `document (workspace.TextDocument)`: document to read from
+        - `position (lsp.Position)`: position in the document
+    returns:
+        - `str`: the word, `""` if there is none
+    """
+    if document.version is None:
+        return document.word_at_position(position)
+    key = (document.uri, document.version, position.line, position.character)
+    if (word := _WORDS.get(key)) is None:
+        if len(_WORDS) >= _WORDS_MAX:
+            _WORDS.clear()
+        word = _WORDS[key] = document.word_at_position(position)
+    return word
+
+
+def forget_document(uri: str) -> None:
+    """drops any cached line offsets and words for a document.
+
+    a reopened document starts again at version 1, so nothing keyed by version
+    may outlive the close.
+
+    args:
+        - `uri (str)`: uri of the document
+    """
+    _LINE_OFFSETS.pop(uri, None)
+    for key in [key for key in _WORDS if key[0] == uri]:
+        del _WORDS[key]
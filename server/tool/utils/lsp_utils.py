@@ -4,6 +4,7 @@
 from __future__ import annotations
 
 import contextlib
+import functools
 import io
 import os
 import os.path
@@ -33,8 +34,12 @@ def is_same_path(file_path1: os.PathLike, file_path2: os.PathLike) -> bool:
     )
 
 
+@functools.lru_cache(maxsize=32)
 def is_current_interpreter(executable) -> bool:
-    """Returns true if the executable path is same as the current interpreter."""
+    """Returns true if the executable path is same as the current interpreter.
+
+    Cached, interpreter paths do not change over the life of the server.
+    """
     return is_same_path(executable, sys.executable)
 
 
@@ -0,0 +1,101 @@
+"""tests for document parsing in `ampl_lsp.AMPLServer`"""
+
+import pathlib
+import sys
+
+import pytest
+
+TOOL_DIR = pathlib.Path(__file__).parents[3] / "server" / "tool"
+if str(TOOL_DIR) not in sys.path:
+    sys.path.insert(0, str(TOOL_DIR))
+
+# pylint: disable=wrong-import-position
+import lsprotocol.types as lsp
+from ampl_lsp import AMPLServer
+from pygls import workspace
+
+SOURCES = {
+    "lf": "param n := 3;\nvar x >= 0;\nx + n\n",
+    "crlf": "param n := 3;\r\nvar x >= 0;\r\nx + n\r\n",
+    "cr": "param n := 3;\rvar x >= 0;\rx + n\r",
+}
+
+# (start line, start character, end line, end character, new text)
+EDITS = (
+    (1, 4, 1, 5, "y"),  # rename within a line
+    (0, 13, 0, 13, "\nvar z;"),  # split a line
+    (2, 0, 2, 0, "set S;\r\n"),  # insert a crlf line
+    (0, 5, 1, 3, ""),  # join two lines
+    (1, 0, 1, 0, "param k;\r"),  # insert a bare cr line
+    (2, 0, 2, 0, "\n"),  # lands right after a bare cr, joins it into \r\n
+    (0, 8, 0, 8, "\r"),  # lands right before a line ending, \n joins into \r\n
+    (3, 0, 4, 0, ""),  # delete a whole line
+)
+
+
+def _server() -> AMPLServer:
+    return AMPLServer("ampl-lsp", "ampl language server", [], version="0")
+
+
+def _change(edit: tuple) -> lsp.TextDocumentContentChangeEvent_Type1:
+    start_line, start_char, end_line, end_char, text = edit
+    return lsp.TextDocumentContentChangeEvent_Type1(
+        range=lsp.Range(
+            start=lsp.Position(line=start_line, character=start_char),
+            end=lsp.Position(line=end_line, character=end_char),
+        ),
+        text=text,
+    )
+
+
+@pytest.mark.parametrize("name", SOURCES)
+def test_parse_changes_matches_full_parse(name: str):
+    """re-parsing only edited lines gives the same result as a full parse"""
+    uri = f"file:///tmp/changes_{name}.mod"
+    server = _server()
+    document = workspace.TextDocument(uri, SOURCES[name], version=1)
+    server.parse_document(document)
+
+    for step, edit in enumerate(EDITS):
+        change = _change(edit)
+        document.apply_change(change)
+        document.version += 1
+        index = server.parse_changes(document, [change])
+
+        expected = _server()
+        reference = workspace.TextDocument(f"{uri}.{step}", document.source, version=1)
+        expected.parse_document(reference)
+        assert server.lines_[uri] == expected.lines_[reference.uri], edit
+        assert index[uri] == expected.index_[reference.uri], edit
+        assert server.occurrences_[uri] == expected.occurrences_[reference.uri], edit
+
+
+def test_occurrences_of_indexed_names():
+    """every use of an indexed name is recorded, other words are not"""
+    uri = "file:///tmp/occurrences.mod"
+    server = _server()
+    server.parse_document(
+        workspace.TextDocument(uri, "x + n;\nparam n;\nvar x;\nx + n + y\n", version=1)
+    )
+
+    assert server.occurrences_[uri] == {
+        "n": [(0, 4, 5), (1, 6, 7), (3, 4, 5)],
+        "x": [(0, 0, 1), (2, 4, 5), (3, 0, 1)],
+    }
+
+
+def test_fallback_settings_follow_global_settings(monkeypatch):
+    """settings of a file outside any workspace pick up new global settings"""
+    monkeypatch.setattr(AMPLServer, "GLOBAL_SETTINGS", {})
+    monkeypatch.setattr(AMPLServer, "WORKSPACE_SETTINGS", {})
+    server = _server()
+    server.update_workspace_settings([])
+    document = workspace.TextDocument("file:///elsewhere/model.mod", "", version=1)
+    server.update_global_settings(args=["--first"])
+    assert server.get_settings_by_document(document)["args"] == ["--first"]
+
+    server.update_global_settings(args=["--second"])
+    assert server.get_settings_by_document(document)["args"] == ["--second"]
+
+    server.forget_document(document)
+    assert document.path not in server._settings_cache  # pylint: disable=W0212
@@ -0,0 +1,72 @@
+"""tests for the AMPL type patterns in `ampl_utils.ampl_types`"""
+
+import pathlib
+import sys
+
+TOOL_DIR = pathlib.Path(__file__).parents[3] / "server" / "tool"
+if str(TOOL_DIR) not in sys.path:
+    sys.path.insert(0, str(TOOL_DIR))
+
+# pylint: disable=wrong-import-position
+import ampl_utils
+import lsprotocol.types as lsp
+from pygls import workspace
+
+
+def test_declared_name_matches_word_at_position():
+    """identifiers are ascii, like the word the client's cursor resolves to"""
+    document = workspace.TextDocument("file:///unicode.mod", "var xé;", version=1)
+    word = document.word_at_position(lsp.Position(line=0, character=4))
+
+    assert ampl_utils.Variable.regex.match(document.source).group(1) == word == "x"
+    assert ampl_utils.IDENT_RE.fullmatch("xé") is None
+
+
+def test_compile_fast_re_fallback_is_ascii(monkeypatch):
+    """the `re` fallback finds the same words re2 would, `\\w` and `\\b` in ascii"""
+    monkeypatch.setattr(ampl_utils.ampl_types, "_re2", lambda: None)
+    word_re = ampl_utils.compile_fast(ampl_utils.WORD_RE.pattern)
+
+    assert word_re.findall("var xé; éy _z") == ["var", "x", "y", "_z"]
+
+
+def test_variable_regex_keyword_lookahead():
+    """only the whole words `if`, `and` and `or` are rejected as declared names"""
+    regex = ampl_utils.Variable.regex
+
+    assert regex.match("var index >= 0;").group(1) == "index"
+    assert regex.match("param order;").group(1) == "order"
+    assert regex.match("var if x") is None
+
+
+def test_classify_tokens_do_not_overlap():
+    """the first type in `_TOKEN_TYPES` wins and consumes the text it matched"""
+    tokens = [
+        (cls.__name__, match.group())
+        for cls, match in ampl_utils.classify("var x >= 0; f(y: number) 12 z")
+    ]
+
+    assert tokens == [
+        ("Variable", "var x"),
+        ("Number", "0"),
+        ("Symbolic", "f"),
+        ("Argument", "y: number"),
+        ("Number", "12"),
+        ("Symbolic", "z"),
+    ]
+    # a function header is also a declaration, `Variable` is tried first
+    assert [
+        cls for cls, _ in ampl_utils.classify("function foo(a: b)")
+    ] == [ampl_utils.Variable, ampl_utils.Argument]
+
+
+def test_match_token_reports_the_first_declaration():
+    """`match_token` reports one declaration type, `scan_line` reports all of them"""
+    name, match = ampl_utils.match_token("function foo(")
+
+    assert (name, match.group()) == ("variable", "function foo")
+    assert [name for name, _ in ampl_utils.scan_line("function foo(")] == [
+        "variable",
+        "function",
+    ]
+    assert ampl_utils.match_token("x + 1") is None
@@ -0,0 +1,37 @@
+"""tests for the document text helpers in `utils.lsp_parsing`"""
+
+import pathlib
+import sys
+
+TOOL_DIR = pathlib.Path(__file__).parents[3] / "server" / "tool"
+if str(TOOL_DIR) not in sys.path:
+    sys.path.insert(0, str(TOOL_DIR))
+
+# pylint: disable=wrong-import-position
+import lsprotocol.types as lsp
+import utils
+from pygls import workspace
+
+
+def test_word_at_position_forgets_closed_documents():
+    """a reopened document restarts at version 1 and must not see old words"""
+    uri = "file:///reopened.mod"
+    position = lsp.Position(line=0, character=1)
+
+    before = workspace.TextDocument(uri, "foo bar", version=1)
+    assert utils.word_at_position(before, position) == "foo"
+
+    utils.forget_document(uri)
+    after = workspace.TextDocument(uri, "baz qux", version=1)
+    assert utils.word_at_position(after, position) == "baz"
+
+
+def test_lines_split_at_every_lsp_line_ending():
+    """`\\r\\n`, `\\r` and `\\n` all end a line, a trailing one starts no new line"""
+    uri = "file:///line_endings.mod"
+    document = workspace.TextDocument(uri, "var a;\rvar b;\r\nb\n", version=1)
+
+    assert list(utils.iter_lines(document)) == ["var a;\r", "var b;\r\n", "b\n"]
+    assert utils.line_count(document) == 3
+    assert utils.get_line(document, 1) == "var b;\r\n"
+    utils.forget_document(uri)
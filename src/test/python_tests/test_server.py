@@ -0,0 +1,19 @@
+"""smoke tests for the language server module"""
+
+import importlib
+import pathlib
+import sys
+
+TOOL_DIR = pathlib.Path(__file__).parents[3] / "server" / "tool"
+if str(TOOL_DIR) not in sys.path:
+    sys.path.insert(0, str(TOOL_DIR))
+
+
+def test_server_imports():
+    """the server module, and every response it builds at import, loads cleanly"""
+    server = importlib.import_module("server")
+
+    assert isinstance(server.LSP_SERVER, server.AMPLServer)
+    registered = server.LSP_SERVER.lsp.fm.features
+    assert all(feature in registered for feature, _, _ in server.HANDLERS)
+    assert server._HELLO_HOVER.contents  # pylint: disable=protected-access